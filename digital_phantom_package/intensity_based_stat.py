@@ -9,10 +9,92 @@ Original file is located at
 
 # intensity_based_stat.py
 
+import functools
+
 from six.moves import range
 from radiomics import base, cMatrices, deprecated
 import numpy as np
 
+try:
+  import numba
+except ImportError:
+  numba = None
+
+if numba is not None:
+  @numba.njit(parallel=True, cache=True)
+  def _voxel_histogram(vals, lut, out):
+    # vals is the (Nvox, Nk) discretized kernel array, -1 for voxels outside the mask.
+    # Accumulates the per-voxel gray level histogram into out (shape (Nvox, Ng)) in a
+    # single pass. lut maps a gray level onto its histogram bin (-1 for absent levels):
+    # grayLevels drops empty bins, so levels are not necessarily contiguous and the bin
+    # cannot be derived from the level value itself.
+    for i in numba.prange(vals.shape[0]):
+      for k in range(vals.shape[1]):
+        v = vals[i, k]
+        if v >= 0:  # skip the invalid-voxel sentinel
+          b = lut[v]
+          if b >= 0:
+            out[i, b] += 1
+
+  @numba.njit(parallel=True, cache=True)
+  def _row_moments(a):
+    # Per-row count, mean and 2nd-4th central moments of the (Nvox, Nk) voxel array in one
+    # parallel pass; NaNs are skipped inline, so no mask or difference temporaries are
+    # materialized. Returns shape (5, Nvox): n, mean, m2, m3, m4.
+    out = np.empty((5, a.shape[0]))
+    for i in numba.prange(a.shape[0]):
+      n = 0.0
+      s = 0.0
+      for k in range(a.shape[1]):
+        v = a[i, k]
+        if v == v:
+          n += 1.0
+          s += v
+      if n == 0.0:
+        n = 1.0  # Prevent division by 0 errors
+      mean = s / n
+
+      m2 = 0.0
+      m3 = 0.0
+      m4 = 0.0
+      for k in range(a.shape[1]):
+        v = a[i, k]
+        if v == v:
+          d = v - mean
+          d2 = d * d
+          m2 += d2
+          m3 += d2 * d
+          m4 += d2 * d2
+
+      out[0, i] = n
+      out[1, i] = mean
+      out[2, i] = m2 / n
+      out[3, i] = m3 / n
+      out[4, i] = m4 / n
+    return out
+
+  @numba.njit(parallel=True, cache=True)
+  def _row_sort(a):
+    # Row-parallel sort of a NaN-free (Nvox, Nk) array; numba's sort does not give np.sort's
+    # NaNs-last guarantee, so callers must only pass fully valid data.
+    out = a.copy()
+    for i in numba.prange(out.shape[0]):
+      out[i].sort()
+    return out
+
+
+def _memoized_feature(func):
+  # Caches a feature getter's result on the instance, so getters that build on other
+  # features (e.g. rMAD on the 10th/90th percentile) never trigger recomputation. The
+  # cache is reset by _initCalculation, so voxel-based batches never see stale values.
+  @functools.wraps(func)
+  def wrapper(self):
+    if func.__name__ not in self._featureCache:
+      self._featureCache[func.__name__] = func(self)
+    return self._featureCache[func.__name__]
+  return wrapper
+
+
 class IntensityBasedStat(base.RadiomicsFeaturesBase):
   """
   Intensity Based Statistical Features describe the distribution of voxel intensities within the image region defined by the mask
@@ -32,7 +114,15 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
 
     self.pixelSpacing = inputImage.GetSpacing()
     self.voxelArrayShift = kwargs.get('voxelArrayShift', 0)
-    self.discretizedImageArray = self._applyBinning(self.imageArray.copy())
+
+    # Discretized gray levels fit comfortably in int16 at a quarter of the float64
+    # footprint; invalid (NaN) voxels are mapped onto a -1 sentinel. In voxel-based mode
+    # the base class has already run _initVoxelBasedCalculation by this point, so the
+    # binning operates on the padded image and the discretized array comes out in the same
+    # padded space the kernel gather indexes into.
+    discretizedImageArray = self._applyBinning(self.imageArray.copy())
+    self.discretizedImageArray = np.where(np.isnan(discretizedImageArray), -1, discretizedImageArray).astype(np.int16)
+
     self._initCalculation()
 
   def _initVoxelBasedCalculation(self):
@@ -50,62 +140,222 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
     boundingBoxSize = np.minimum(size, kernelRadius * 2 + 1)
 
     # Calculate the offsets, which can be used to generate a list of kernel Coordinates. Shape (Nd, Nk)
-    self.kernelOffsets = cMatrices.generate_angles(boundingBoxSize,
-                                                   np.array(range(1, kernelRadius + 1)),
-                                                   True,  # Bi-directional
-                                                   self.settings.get('force2D', False),
-                                                   self.settings.get('force2Ddimension', 0))
-    self.kernelOffsets = np.append(self.kernelOffsets, [[0, 0, 0]], axis=0)  # add center voxel
-    self.kernelOffsets = self.kernelOffsets.transpose((1, 0))
-
-    self.imageArray = self.imageArray.astype('float')
-    self.imageArray[~self.maskArray] = np.nan
-    self.imageArray = np.pad(self.imageArray,
-                                pad_width=self.settings.get('kernelRadius', 1),
-                                mode='constant', constant_values=np.nan)
-    self.maskArray = np.pad(self.maskArray,
-                               pad_width=self.settings.get('kernelRadius', 1),
-                               mode='constant', constant_values=False)
+    angles = cMatrices.generate_angles(boundingBoxSize,
+                                       np.array(range(1, kernelRadius + 1)),
+                                       True,  # Bi-directional
+                                       self.settings.get('force2D', False),
+                                       self.settings.get('force2Ddimension', 0))
+
+    # Preallocate at the final size rather than copying the angle list with np.append
+    kernelOffsets = np.empty((angles.shape[0] + 1, angles.shape[1]), dtype=angles.dtype)
+    kernelOffsets[:-1] = angles
+    kernelOffsets[-1] = 0  # add center voxel
+    self.kernelOffsets = kernelOffsets.transpose((1, 0))
+
+    # Allocate the padded arrays once and fill their interiors through views. This avoids
+    # the intermediate float copy and the additional full-size copy np.pad would make.
+    paddedShape = tuple(np.array(self.imageArray.shape) + 2 * kernelRadius)
+    interior = tuple(slice(kernelRadius, kernelRadius + s) for s in self.imageArray.shape)
+
+    paddedImage = np.full(paddedShape, np.nan, dtype=np.float32)
+    np.copyto(paddedImage[interior], self.imageArray, where=self.maskArray)  # outside mask stays NaN
+
+    paddedMask = np.zeros(paddedShape, dtype='bool')
+    paddedMask[interior] = self.maskArray
+
+    self.imageArray = paddedImage
+    self.maskArray = paddedMask
+
+    # Per-batch invariants of the flattened gather in _initCalculation: the kernel radius
+    # (settings lookup) and the flat offsets only depend on the padded shape, so hoist them
+    # out of the per-batch path here.
+    self.kernelRadius = kernelRadius
+    self._strides = np.array([paddedShape[1] * paddedShape[2], paddedShape[2], 1])  # C-order element strides
+    self._flatOffsets = np.dot(self._strides, self.kernelOffsets)  # shape (Nk,)
 
   def _initCalculation(self, voxelCoordinates=None):
 
+    self._featureCache = {}
+
     if voxelCoordinates is None:
-      self.targetVoxelArray = self.imageArray[self.maskArray].astype('float').reshape((1, -1))
+      self.targetVoxelArray = self.imageArray[self.maskArray].astype(np.float32).reshape((1, -1))
       _, p_i = np.unique(self.discretizedImageArray[self.maskArray], return_counts=True)
       p_i = p_i.reshape((1, -1))
     else:
       # voxelCoordinates shape (Nd, Nvox)
-      voxelCoordinates = voxelCoordinates.copy() + self.settings.get('kernelRadius', 1)  # adjust for padding
-      kernelCoords = self.kernelOffsets[:, None, :] + voxelCoordinates[:, :, None]  # Shape (Nd, Nvox, Nk)
-      kernelCoords = tuple(kernelCoords)  # shape (Nd, (Nvox, Nk))
-
-      self.targetVoxelArray = self.imageArray[kernelCoords]  # shape (Nvox, Nk)
-
-      p_i = np.empty((voxelCoordinates.shape[1], len(self.coefficients['grayLevels'])))  # shape (Nvox, Ng)
-      for gl_idx, gl in enumerate(self.coefficients['grayLevels']):
-        p_i[:, gl_idx] = np.nansum(self.discretizedImageArray[kernelCoords] == gl, 1)
+      # Flattened gather: translating the kernel offsets and (padding-adjusted) centers into
+      # flat indices into the padded volume avoids materializing the (Nd, Nvox, Nk) broadcast
+      # coordinate array required by tuple indexing. Strides and offsets are precomputed in
+      # _initVoxelBasedCalculation.
+      flatCenters = np.dot(self._strides, voxelCoordinates + self.kernelRadius)  # shape (Nvox,)
+      flatCoords = flatCenters[:, None] + self._flatOffsets[None, :]  # shape (Nvox, Nk)
+
+      self.targetVoxelArray = np.take(self.imageArray, flatCoords)  # shape (Nvox, Nk)
+
+      grayLevels = self.coefficients['grayLevels']
+      discretizedVoxelArray = np.take(self.discretizedImageArray, flatCoords)  # shape (Nvox, Nk)
+
+      # Dense LUT mapping gray level -> histogram bin; grayLevels drops empty bins, so the
+      # levels can be gapped and the bin must not be derived from the level value directly.
+      glIndices = grayLevels.astype('intp')
+      lut = np.full(glIndices.max() + 1, -1, dtype='intp')
+      lut[glIndices] = np.arange(len(grayLevels))
+
+      p_i = np.zeros((voxelCoordinates.shape[1], len(grayLevels)))  # shape (Nvox, Ng)
+      if numba is not None:
+        # Single pass over the kernel array, accumulating all gray level counts at once
+        _voxel_histogram(discretizedVoxelArray, lut, p_i)
+      else:
+        # Vectorized histogram: map each (voxel, gray level) pair onto a flat bin index and
+        # count all pairs with one bincount call. The LUT drops both the invalid-voxel
+        # sentinel and any value without a histogram bin (gapped gray levels).
+        valid = discretizedVoxelArray >= 0
+        rows = np.nonzero(valid)[0]
+        bins = lut[discretizedVoxelArray[valid]]
+        rows = rows[bins >= 0]
+        bins = bins[bins >= 0]
+        p_i[:] = np.bincount(rows * len(grayLevels) + bins, minlength=p_i.size).reshape(p_i.shape)
+
+    # Cache the NaN mask and per-voxel valid count once; every reducer below would
+    # otherwise recompute them with a full pass over the voxel array.
+    self._nanmask = np.isnan(self.targetVoxelArray)
+    self._nvox = np.sum(~self._nanmask, 1).astype('float')
+
+    # In the whole-ROI case invalid voxels can be compacted away up-front (dropping them
+    # does not change any row statistic), after which all reducers may take the plain
+    # non-NaN-scanning code paths flagged by _allValid.
+    if self.targetVoxelArray.shape[0] == 1 and self._nanmask.any():
+      self.targetVoxelArray = self.targetVoxelArray[~self._nanmask].reshape((1, -1))
+      self._nanmask = np.zeros(self.targetVoxelArray.shape, dtype='bool')
+      self._nvox = np.array([self.targetVoxelArray.shape[1]], dtype='float')
+    self._allValid = not self._nanmask.any()
+
+    # Reusable scratch buffer for the element-wise getters; with out= ufuncs this bounds
+    # them to a single full-size temporary instead of one fresh allocation per operation.
+    # Matching the voxel array's dtype keeps the buffer at float32 size.
+    self._scratch = np.empty(self.targetVoxelArray.shape, dtype=self.targetVoxelArray.dtype)
 
     sumBins = np.sum(p_i, 1, keepdims=True).astype('float')
     sumBins[sumBins == 0] = 1  # Prevent division by 0 errors
     p_i = p_i.astype('float') / sumBins
     self.coefficients['p_i'] = p_i
 
+    if not self._shortCircuitDegenerate():
+      self._computeCentralMoments()
+      self._computePercentiles()
+
     self.logger.debug('First order feature class initialized')
 
-  @staticmethod
-  def _moment(a, moment=1):
+  def _shortCircuitDegenerate(self):
     r"""
-    Calculate n-order moment of an array for a given axis
+    Fill the statistic caches directly for degenerate ROIs, skipping the sort and moment reductions.
+
+    An empty mask yields NaN for every statistic (there is no defensible mean or order statistic over zero voxels); a
+    uniform whole-ROI region (e.g. a flat phantom compartment) has zero central moments and every order statistic equal
+    to the constant value. Both cases are detected with at most one cheap pass over the voxel array. Returns True when
+    the short-circuit applied.
     """
 
-    if moment == 1:
-      return np.float(0.0)
+    a = self.targetVoxelArray
+
+    if a.size == 0:
+      nRows = a.shape[0]
+      self.coefficients['n'] = np.zeros(nRows)
+      self.coefficients['mean'] = np.full(nRows, np.nan)
+      self.coefficients['m2'] = np.full(nRows, np.nan)
+      self.coefficients['m3'] = np.full(nRows, np.nan)
+      self.coefficients['m4'] = np.full(nRows, np.nan)
+      # A single NaN column keeps the sorted-view lookups (min at [:, 0], max at the last
+      # valid position) in bounds and returning NaN rather than raising on the empty array
+      self.coefficients['sorted'] = np.full((nRows, 1), np.nan)
+      self.coefficients['pct'] = np.full((5, nRows), np.nan)
+      return True
+
+    if a.shape[0] == 1 and self._allValid and a.flat[0] == a.flat[-1] and np.all(a == a.flat[0]):
+      c = float(a.flat[0])
+      self.coefficients['n'] = self._nvox.copy()
+      self.coefficients['mean'] = np.array([c])
+      self.coefficients['m2'] = np.zeros(1)
+      self.coefficients['m3'] = np.zeros(1)
+      self.coefficients['m4'] = np.zeros(1)
+      self.coefficients['sorted'] = a  # a uniform row is already ordered
+      self.coefficients['pct'] = np.full((5, 1), c)
+      return True
+
+    return False
+
+  def _computeCentralMoments(self):
+    r"""
+    Compute the valid-voxel count, mean and 2nd to 4th central moments of ``targetVoxelArray`` in a single pass.
+
+    The difference array ``d = a - mean`` is allocated once and raised to the higher powers in-place, so only one
+    additional temporary the size of the voxel array is needed for all four moments. Results are cached in
+    ``self.coefficients`` under keys 'n', 'mean', 'm2', 'm3' and 'm4'.
+    """
+
+    a = self.targetVoxelArray
+
+    if numba is not None and a.shape[0] > 1:
+      # Voxel-based mode: one parallel pass over all rows, no temporaries
+      n, mean, m2, m3, m4 = _row_moments(a)
+      self.coefficients['n'] = n
+      self.coefficients['mean'] = mean
+      self.coefficients['m2'] = m2
+      self.coefficients['m3'] = m3
+      self.coefficients['m4'] = m4
+      return
+
+    n = self._nvox.copy()
+    n[n == 0] = 1  # Prevent division by 0 errors
+
+    rowsum = np.sum if self._allValid else np.nansum
+    mean = rowsum(a, 1) / n
+
+    d = a - mean[:, None]  # shape (Nvox, Nk), reused for all higher powers
+    p = d * d
+    m2 = rowsum(p, 1) / n
+    np.multiply(p, d, out=p)
+    m3 = rowsum(p, 1) / n
+    np.multiply(p, d, out=p)
+    m4 = rowsum(p, 1) / n
+
+    self.coefficients['n'] = n
+    self.coefficients['mean'] = mean
+    self.coefficients['m2'] = m2
+    self.coefficients['m3'] = m3
+    self.coefficients['m4'] = m4
+
+  def _computePercentiles(self):
+    r"""
+    Sort ``targetVoxelArray`` once per row and derive all order statistics from the sorted view.
+
+    ``np.sort`` pushes NaNs to the end of each row, so together with the cached valid count a single sort serves the
+    10th/25th/50th/75th/90th percentiles (linear interpolation, matching the ``np.percentile`` definition) as well as
+    Minimum, Maximum and Range, which become direct lookups at the first and last valid position. The sorted array is
+    cached in ``self.coefficients['sorted']`` and the percentiles (shape (5, Nvox)) in ``self.coefficients['pct']``.
+    """
+
+    a = self.targetVoxelArray
+    if numba is not None and a.shape[0] > 1 and self._allValid:
+      srt = _row_sort(a)  # row-parallel; only safe without NaNs
     else:
-      mn = np.nanmean(a, 1, keepdims=True)
-      s = np.power((a - mn), moment)
-      return np.nanmean(s, 1)
+      srt = np.sort(a, 1)  # NaNs sort to the end of each row
+    self.coefficients['sorted'] = srt
+
+    if srt.shape[1] == 0:
+      self.coefficients['pct'] = np.full((5, srt.shape[0]), np.nan)
+      return
 
+    qs = np.array([10., 25., 50., 75., 90.])
+    idx = np.maximum(qs[:, None] / 100. * (self._nvox[None, :] - 1), 0)  # shape (5, Nvox)
+    lo = np.floor(idx).astype('intp')
+    hi = np.ceil(idx).astype('intp')
+    w = idx - lo
 
+    rows = np.arange(srt.shape[0])[None, :]
+    self.coefficients['pct'] = srt[rows, lo] * (1 - w) + srt[rows, hi] * w
+
+  @_memoized_feature
   def getMeanIntensity(self):
     r"""
     **1. Mean**
@@ -113,9 +363,10 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
     The average gray level intensity within the ROI.
     """
 
-    return np.nanmean(self.targetVoxelArray, 1)
+    return self.coefficients['mean']
 
 
+  @_memoized_feature
   def getVarianceIntensity(self):
     r"""
     **2. Variance**
@@ -124,8 +375,9 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
     the spread of the distribution about the mean. By definition, :math:`\textit{variance} = \sigma^2`
     """
 
-    return np.nanstd(self.targetVoxelArray, 1) ** 2
+    return self.coefficients['m2']
 
+  @_memoized_feature
   def getIntensitySkewness(self):
     r"""
     **3. Skewness**
@@ -139,15 +391,16 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
 
     """
 
-    m2 = self._moment(self.targetVoxelArray, 2)
-    m3 = self._moment(self.targetVoxelArray, 3)
+    m2 = self.coefficients['m2'].copy()
+    m3 = self.coefficients['m3'].copy()
 
-    m2[m2 == 0] = 1  # Flat Region, prevent division by 0 errors
     m3[m2 == 0] = 0  # ensure Flat Regions are returned as 0
+    m2[m2 == 0] = 1  # Flat Region, prevent division by 0 errors
 
-    return m3 / m2 ** 1.5
+    return m3 / (m2 * np.sqrt(m2))  # m2 ** 1.5 without the pow call
 
 
+  @_memoized_feature
   def getIntensityKurtosis(self):
     r"""
     **4. Kurtosis**
@@ -162,15 +415,16 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
 
     """
 
-    m2 = self._moment(self.targetVoxelArray, 2)
-    m4 = self._moment(self.targetVoxelArray, 4)
+    m2 = self.coefficients['m2'].copy()
+    m4 = self.coefficients['m4'].copy()
 
-    m2[m2 == 0] = 1  # Flat Region, prevent division by 0 errors
     m4[m2 == 0] = 0  # ensure Flat Regions are returned as 0
+    m2[m2 == 0] = 1  # Flat Region, prevent division by 0 errors
 
-    return m4 / m2 ** 2.0
+    return m4 / (m2 * m2)
 
 
+  @_memoized_feature
   def getMedianIntensity(self):
     r"""
     **5. Median**
@@ -178,19 +432,22 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
     The median gray level intensity within the ROI.
     """
 
-    return np.nanmedian(self.targetVoxelArray, 1)
+    return self.coefficients['pct'][2]
 
 
 
+  @_memoized_feature
   def getMinimumIntensity(self):
     r"""
     **6. Minimum**
 
     """
 
-    return np.nanmin(self.targetVoxelArray, 1)
+    # NaNs sort to the end, so the first sorted position is the minimum valid value
+    return self.coefficients['sorted'][:, 0]
 
 
+  @_memoized_feature
   def get10IntensityPercentile(self):
     r"""
     **7. 10th percentile**
@@ -198,9 +455,10 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
     The 10th percentile of {X}
 
     """
-    return np.nanpercentile(self.targetVoxelArray, 10, axis=1)
+    return self.coefficients['pct'][0]
 
 
+  @_memoized_feature
   def get90IntensityPercentile(self):
     r"""
     **8. 90th percentile**
@@ -208,9 +466,10 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
     The 90th percentile of {X}
     """
 
-    return np.nanpercentile(self.targetVoxelArray, 90, axis=1)
+    return self.coefficients['pct'][4]
 
 
+  @_memoized_feature
   def getMaximumIntensity(self):
     r"""
     **9. Maximum**
@@ -218,11 +477,17 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
     The maximum gray level intensity within the ROI.
     """
 
-    return np.nanmax(self.targetVoxelArray, 1)
+    srt = self.coefficients['sorted']
+    if self._allValid:
+      return srt[:, -1]
+    # Last valid position per row; NaNs occupy the tail of each sorted row
+    last = np.maximum(self._nvox.astype('intp') - 1, 0)
+    return srt[np.arange(srt.shape[0]), last]
 
 
 
 
+  @_memoized_feature
   def getIntensityInterquartileRange(self):
     r"""
     **10. Interquartile Range**
@@ -230,9 +495,10 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
     The 25th and 75th percentile of the image array.
     """
 
-    return np.nanpercentile(self.targetVoxelArray, 75, 1) - np.nanpercentile(self.targetVoxelArray, 25, 1)
+    return self.coefficients['pct'][3] - self.coefficients['pct'][1]
 
 
+  @_memoized_feature
   def getIntensityRange(self):
     r"""
     **11. Range**
@@ -240,9 +506,10 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
     The range of gray values in the ROI.
     """
 
-    return np.nanmax(self.targetVoxelArray, 1) - np.nanmin(self.targetVoxelArray, 1)
+    return self.getMaximumIntensity() - self.getMinimumIntensity()
 
 
+  @_memoized_feature
   def getIntensityMeanAbsoluteDeviation(self):
     r"""
     **12. Mean Absolute Deviation (MAD)**
@@ -250,10 +517,15 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
     Mean Absolute Deviation is the mean distance of all intensity values from the Mean Value of the image array.
     """
 
-    u_x = np.nanmean(self.targetVoxelArray, 1, keepdims=True)
-    return np.nanmean(np.absolute(self.targetVoxelArray - u_x), 1)
+    u_x = self.coefficients['mean'][:, None]
+    buf = np.subtract(self.targetVoxelArray, u_x, out=self._scratch)
+    np.absolute(buf, out=buf)
+    if self._allValid:
+      return np.mean(buf, 1)
+    return np.nanmean(buf, 1)
 
 
+  @_memoized_feature
   def getIntensityRobustMeanAbsoluteDeviation(self):
     r"""
     **13. Robust Mean Absolute Deviation (rMAD)**
@@ -265,26 +537,41 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
 
     prcnt10 = self.get10IntensityPercentile()
     prcnt90 = self.get90IntensityPercentile()
-    percentileArray = self.targetVoxelArray.copy()
+    a = self.targetVoxelArray
+
+    # Mask of valid voxels inside the closed 10-90th percentile range. Out-of-range voxels
+    # are excluded through the mask rather than by NaN-ing out a copy of the voxel array.
+    msk = ~self._nanmask & (a >= prcnt10[:, None]) & (a <= prcnt90[:, None])
+
+    n = np.sum(msk, 1).astype('float')
+    n[n == 0] = 1  # Prevent division by 0 errors
 
-    # First get a mask for all valid voxels
-    msk = ~np.isnan(percentileArray)
-    # Then, update the mask to reflect all valid voxels that are outside the the closed 10-90th percentile range
-    msk[msk] = ((percentileArray - prcnt10[:, None])[msk] < 0) | ((percentileArray - prcnt90[:, None])[msk] > 0)
-    # Finally, exclude the invalid voxels by setting them to numpy.nan.
-    percentileArray[msk] = np.nan
+    buf = self._scratch
+    np.copyto(buf, a)
+    buf[~msk] = 0  # also clears the NaNs, which are always outside msk
+    robustMean = np.sum(buf, 1, keepdims=True) / n[:, None]
 
-    return np.nanmean(np.absolute(percentileArray - np.nanmean(percentileArray, 1, keepdims=True)), 1)
+    np.subtract(a, robustMean, out=buf)
+    np.absolute(buf, out=buf)
+    buf[~msk] = 0
 
+    return np.sum(buf, 1) / n
+
+  @_memoized_feature
   def getIntensityMedianAbsoluteDeviation(self):
     r"""
     **14. **
 
     """
     median_intensity = self.getMedianIntensity()
-    return np.nanmedian(np.absolute(self.targetVoxelArray - median_intensity[:, None]), 1)
+    buf = np.subtract(self.targetVoxelArray, median_intensity[:, None], out=self._scratch)
+    np.absolute(buf, out=buf)
+    if self._allValid:
+      return np.median(buf, 1, overwrite_input=True)
+    return np.nanmedian(buf, 1, overwrite_input=True)
 
 
+  @_memoized_feature
   def getIntensityCoefficientOfVariation(self):
     r"""
     **15. **
@@ -293,22 +580,33 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
     """
     mean_intensity = self.getMeanIntensity()
     std_intensity = self.getStandardDeviationIntensity()
-    return np.nan_to_num(std_intensity / mean_intensity, nan=0, posinf=0, neginf=0)
+
+    # Mask degenerate denominators up-front instead of dividing, warning and patching the
+    # result with nan_to_num; masked voxels get the same 0 the patching produced.
+    msk = (mean_intensity == 0) | ~np.isfinite(mean_intensity) | ~np.isfinite(std_intensity)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      return np.where(msk, 0, std_intensity / np.where(msk, 1, mean_intensity))
 
 
 
+  @_memoized_feature
   def getIntensityQuartileCoefficientOfDispersion(self):
     r"""
     **16. **
 
 
     """
-    q75_intensity = np.nanpercentile(self.targetVoxelArray, 75, axis=1)
-    q25_intensity = np.nanpercentile(self.targetVoxelArray, 25, axis=1)
-    return np.nan_to_num((q75_intensity - q25_intensity) / (q75_intensity + q25_intensity), nan=0, posinf=0, neginf=0)
+    q75_intensity = self.coefficients['pct'][3]
+    q25_intensity = self.coefficients['pct'][1]
+
+    denominator = q75_intensity + q25_intensity
+    msk = (denominator == 0) | ~np.isfinite(denominator)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      return np.where(msk, 0, (q75_intensity - q25_intensity) / np.where(msk, 1, denominator))
 
 
 
+  @_memoized_feature
   def getIntensityEnergy(self):
       r"""
       **17. Energy**
@@ -318,11 +616,14 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
 
       """
 
-      shiftedParameterArray = self.targetVoxelArray + self.voxelArrayShift
+      # nansum((x + c)^2) decomposes as n * (m2 + (mean + c)^2), so Energy follows from
+      # the cached moments without shifting and squaring the voxel array again.
+      shiftedMean = self.coefficients['mean'] + self.voxelArrayShift
 
-      return np.nansum(shiftedParameterArray ** 2, 1)
+      return self.coefficients['n'] * (self.coefficients['m2'] + shiftedMean * shiftedMean)
 
 
+  @_memoized_feature
   def getRootMeanSquareIntensity(self):
     r"""
     **18. Root Mean Squared (RMS)**
@@ -336,11 +637,12 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
     if self.targetVoxelArray.size == 0:
       return 0
 
-    shiftedParameterArray = self.targetVoxelArray + self.voxelArrayShift
-    Nvox = np.sum(~np.isnan(self.targetVoxelArray), 1).astype('float')
-    return np.sqrt(np.nansum(shiftedParameterArray ** 2, 1) / Nvox)
+    # Same decomposition as Energy: mean((x + c)^2) = m2 + (mean + c)^2
+    shiftedMean = self.coefficients['mean'] + self.voxelArrayShift
+    return np.sqrt(self.coefficients['m2'] + shiftedMean * shiftedMean)
 
 
+  @_memoized_feature
   def getStandardDeviationIntensity(self):
     r"""
     **19. Standard Deviation**
@@ -349,4 +651,4 @@ class IntensityBasedStat(base.RadiomicsFeaturesBase):
 
     """
 
-    return np.nanstd(self.targetVoxelArray, axis=1)
\ No newline at end of file
+    return np.sqrt(self.coefficients['m2'])
\ No newline at end of file